@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
-from datetime import datetime
+import os
+import re
+import time
+from collections import OrderedDict, deque
 from enum import Enum
-from typing import Any, Dict, List, Optional
-
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel, Field, ConfigDict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from html import escape
+from itertools import count, islice
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
 
 # ---------------------------
 # Clinic configuration (demo placeholders)
@@ -43,17 +55,18 @@ CLINIC = {
 # ---------------------------
 # FAQ router (starter set)
 # ---------------------------
+# Answers are rendered from CLINIC once at import; CLINIC is static config.
 
 FAQ = [
     {
         "key": "hours",
         "keywords": ["hours", "opening", "open", "close", "closing", "weekend", "saturday", "sunday", "today", "tomorrow"],
-        "answer": lambda: f"Our opening hours are: {CLINIC['hours']}.",
+        "answer": f"Our opening hours are: {CLINIC['hours']}.",
     },
     {
         "key": "location_parking",
         "keywords": ["address", "location", "where", "parking", "park", "garage", "public transport", "tram", "metro", "u-bahn", "bus"],
-        "answer": lambda: (
+        "answer": (
             f"Address: {CLINIC['address']}.\n"
             f"Parking: {CLINIC['parking']}\n"
             f"Public transport: {CLINIC['public_transport']}"
@@ -62,7 +75,7 @@ FAQ = [
     {
         "key": "booking",
         "keywords": ["appointment", "book", "booking", "schedule", "available", "availability"],
-        "answer": lambda: (
+        "answer": (
             "I can help arrange an appointment request. "
             "Please share your **name**, **phone number**, and the **best time window** to reach you."
         ),
@@ -71,7 +84,7 @@ FAQ = [
     {
         "key": "reschedule_cancel",
         "keywords": ["reschedule", "change appointment", "move appointment", "cancel", "cancellation"],
-        "answer": lambda: (
+        "answer": (
             f"To cancel or reschedule, please share your **name**, **phone number**, and your preferred new time window.\n\n"
             f"Policy: {CLINIC['cancellation_policy']}"
         ),
@@ -80,7 +93,7 @@ FAQ = [
     {
         "key": "emergency",
         "keywords": ["emergency", "urgent", "swelling", "bleeding", "fever", "can’t breathe", "can't breathe", "hard to swallow", "severe pain"],
-        "answer": lambda: (
+        "answer": (
             f"{CLINIC['emergency_note']}\n\n"
             f"If you want a same-day assessment, share your **name**, **phone number**, and **best time** to call."
         ),
@@ -89,7 +102,7 @@ FAQ = [
     {
         "key": "services",
         "keywords": ["services", "do you do", "offer", "cleaning", "filling", "implant", "braces", "root canal", "kids", "child"],
-        "answer": lambda: (
+        "answer": (
             "We offer:\n- " + "\n- ".join(CLINIC["services"]) +
             "\n\nIf you'd like, tell me what you need and I can arrange a callback."
         ),
@@ -97,7 +110,7 @@ FAQ = [
     {
         "key": "pricing_insurance",
         "keywords": ["price", "pricing", "cost", "how much", "insurance", "kassa", "private", "payment"],
-        "answer": lambda: (
+        "answer": (
             f"Pricing depends on the service and insurance coverage. {CLINIC['insurance']}\n"
             "If you tell me which service you’re asking about (e.g., cleaning, filling, implant), "
             "I can arrange a callback with an estimated range."
@@ -106,7 +119,7 @@ FAQ = [
     {
         "key": "what_to_bring",
         "keywords": ["what to bring", "bring", "documents", "paperwork", "e-card", "id", "records", "first visit", "new patient"],
-        "answer": lambda: f"For your visit, please bring: {CLINIC['what_to_bring']}",
+        "answer": f"For your visit, please bring: {CLINIC['what_to_bring']}",
     },
 ]
 
@@ -120,23 +133,33 @@ class Step(str, Enum):
     HANDOFF = "HANDOFF"
 
 
-class Collected(BaseModel):
+# Collected and SessionState are mutated on every turn, so they are plain
+# slotted dataclasses (no validation on attribute writes). Pydantic still
+# validates them wherever they cross the API boundary as model fields.
+@dataclass(slots=True)
+class Collected:
     name: Optional[str] = None
     phone: Optional[str] = None
     best_time: Optional[str] = None
 
 
-class SessionState(BaseModel):
+@dataclass(slots=True)
+class SessionState:
     step: Step = Step.LIMITED_RESPONSE
     procedure: Optional[str] = None
     intent: Optional[str] = None
-    collected: Collected = Field(default_factory=Collected)
+    collected: Collected = field(default_factory=Collected)
+
+
+# Upper bound on a single chat message; anything longer is rejected with 422
+# before it reaches the extractors.
+MAX_MESSAGE_LENGTH = 4000
 
 
 class IncomingMessage(BaseModel):
     # Keep your "Postman shape" stable
     session_id: str
-    user_message: str
+    user_message: str = Field(max_length=MAX_MESSAGE_LENGTH)
     channel: str = "webchat"
     practice_name: str = "Example Dental Clinic"
     prior_state: Optional[SessionState] = None
@@ -172,18 +195,55 @@ class Ticket(BaseModel):
     summary: str
     status: str = "OPEN"
 
+    # Escaped <tr> for the staff dashboard, rendered once in create_ticket.
+    # Tickets are never edited, so the cached row never goes stale.
+    _row_html: str = ""
 
-TICKET_DB: List[Ticket] = []
-TICKET_COUNTER = 0
 
+_TICKET_ROW_TEMPLATE = (
+    "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>"
+)
 
-def create_ticket(session_id: str, practice_name: str, state: SessionState, summary: str) -> Ticket:
-    global TICKET_COUNTER
-    TICKET_COUNTER += 1
 
+def _ticket_row_html(t: Ticket) -> str:
+    return _TICKET_ROW_TEMPLATE.format(
+        escape(t.ticket_id),
+        escape(t.created_at),
+        escape(t.name),
+        escape(t.phone),
+        escape(t.best_time),
+        escape(t.summary),
+        escape(t.status),
+    )
+
+
+TICKET_DB_MAXLEN = 10_000
+
+# Newest first; appendleft is O(1) and the oldest tickets fall off at maxlen.
+TICKET_DB: Deque[Ticket] = deque(maxlen=TICKET_DB_MAXLEN)
+
+# next() on itertools.count is a single C call, so ids stay unique without a
+# lock even if handlers are interleaved or moved back onto the threadpool.
+_TICKET_IDS = count(1)
+
+
+# Tickets only carry second resolution, so the formatted string is reused for
+# every ticket created within the same second.
+_ts_cache: Dict[str, Any] = {"sec": -1, "s": ""}
+
+
+def _utc_timestamp() -> str:
+    now = int(time.time())
+    if now != _ts_cache["sec"]:
+        _ts_cache["s"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+        _ts_cache["sec"] = now
+    return _ts_cache["s"]
+
+
+def create_ticket(session_id: str, practice_name: str, state: SessionState, summary: str) -> Ticket:
     ticket = Ticket(
-        ticket_id=f"T-{TICKET_COUNTER:04d}",
-        created_at=datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        ticket_id=f"T-{next(_TICKET_IDS):04d}",
+        created_at=_utc_timestamp(),
         session_id=session_id,
         practice_name=practice_name,
         name=state.collected.name or "",
@@ -192,16 +252,86 @@ def create_ticket(session_id: str, practice_name: str, state: SessionState, summ
         summary=summary,
         status="OPEN",
     )
-    TICKET_DB.insert(0, ticket)  # newest first
+    ticket._row_html = _ticket_row_html(ticket)
+    TICKET_DB.appendleft(ticket)  # newest first
+    if _ticket_queue is not None:
+        try:
+            _ticket_queue.put_nowait(ticket)  # persisted in the background
+        except asyncio.QueueFull:
+            logging.error("Ticket log queue full; %s kept in memory only", ticket.ticket_id)
     return ticket
 
 
-def match_faq_intent(text: str) -> Optional[dict]:
-    t = text.lower()
+# ---------------------------
+# Ticket persistence (optional)
+# ---------------------------
+
+# Set TICKET_LOG_PATH (e.g. "tickets.jsonl") to append every ticket to a
+# JSON-lines file. Writes happen off the request path: handlers only enqueue,
+# and a background task flushes batches to disk.
+TICKET_LOG_PATH = os.environ.get("TICKET_LOG_PATH")
+TICKET_FLUSH_BATCH = 100
+TICKET_FLUSH_INTERVAL = 5.0  # seconds
+# Bounds memory if the disk stalls; tickets beyond it are only kept in memory.
+TICKET_QUEUE_MAXSIZE = 10_000
+
+# Created in lifespan() when persistence is enabled; None means in-memory only.
+_ticket_queue: Optional[asyncio.Queue] = None
+
+
+def _append_ticket_log(batch: List[Ticket]) -> None:
+    with open(TICKET_LOG_PATH, "ab") as f:
+        f.write(b"".join(orjson.dumps(t.model_dump()) + b"\n" for t in batch))
+
+
+async def _flush_tickets(queue: asyncio.Queue) -> None:
+    """
+    Collect tickets until TICKET_FLUSH_BATCH items or TICKET_FLUSH_INTERVAL
+    seconds, then write the batch in one go. A None sentinel flushes what is
+    pending and stops the loop.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        batch: List[Ticket] = []
+        item = await queue.get()
+        deadline = loop.time() + TICKET_FLUSH_INTERVAL
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= TICKET_FLUSH_BATCH:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+        else:
+            stopping = True
+
+        if batch:
+            try:
+                await asyncio.to_thread(_append_ticket_log, batch)
+            except Exception:
+                # Keep the loop alive: a dead flusher would leave the queue
+                # undrained and make the shutdown drain raise.
+                logging.exception("Failed to persist %d ticket(s)", len(batch))
+
+
+# (entry, keywords) pairs built once at import. Plain nested loops over
+# tuples avoid the per-entry generator that any() would create, and a single
+# lowered copy of the message is scanned with C-level substring checks.
+_FAQ_KEYWORDS: Tuple[Tuple[dict, Tuple[str, ...]], ...] = tuple(
+    (item, tuple(item["keywords"])) for item in FAQ
+)
+
+
+def match_faq_intent(text: str, text_lc: Optional[str] = None) -> Optional[dict]:
+    # text_lc: the already-lowered message, if the caller has one
+    t = text_lc if text_lc is not None else text.lower()
     # simple keyword match; first hit wins
-    for item in FAQ:
-        if any(k in t for k in item["keywords"]):
-            return item
+    for item, keywords in _FAQ_KEYWORDS:
+        for k in keywords:
+            if k in t:
+                return item
     return None
 
 
@@ -209,20 +339,118 @@ def match_faq_intent(text: str) -> Optional[dict]:
 # App + global error handler
 # ---------------------------
 
-app = FastAPI(title="Dental Clinic Agentic Demo", version="0.3.0")
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson (C/Rust) instead of stdlib json.dumps.
+    Defined here because fastapi.responses.ORJSONResponse is deprecated in
+    recent FastAPI releases.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _ticket_queue
+    flusher = None
+    if TICKET_LOG_PATH:
+        _ticket_queue = asyncio.Queue(maxsize=TICKET_QUEUE_MAXSIZE)
+        flusher = asyncio.create_task(_flush_tickets(_ticket_queue))
+
+    yield
+
+    if flusher is not None:
+        # Drain: the sentinel makes the flusher write anything still queued.
+        await _ticket_queue.put(None)
+        await flusher
+        _ticket_queue = None
+
+
+app = FastAPI(
+    title="Dental Clinic Agentic Demo",
+    version="0.3.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+
+# Set DEBUG=1 to include exception details in 500 responses. Off by default so
+# internal errors are not leaked to clients.
+DEBUG = os.environ.get("DEBUG", "").lower() in ("1", "true", "yes")
+
+_INTERNAL_ERROR_BODY = b'{"error":"internal_error"}'
 
 
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     logging.exception("Unhandled server error")
-    return JSONResponse(status_code=500, content={"error": "internal_error", "detail": str(exc)})
+    if DEBUG:
+        return ORJSONResponse(status_code=500, content={"error": "internal_error", "detail": str(exc)})
+    return Response(content=_INTERNAL_ERROR_BODY, status_code=500, media_type="application/json")
 
 
 # ---------------------------
 # In-memory session store
 # ---------------------------
 
-SESSION_DB: Dict[str, SessionState] = {}
+SESSION_TTL_SECONDS = 3600
+SESSION_MAX_ENTRIES = 100_000
+
+
+class SessionStore:
+    """
+    Dict-like session map with idle expiry: a session not saved for `ttl`
+    seconds is dropped. Entries are kept in last-write order, so expired
+    ones always sit at the front and pruning stops at the first live entry.
+    Past `maxsize` entries the least recently saved session is evicted.
+    """
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Tuple[float, SessionState]] = OrderedDict()
+
+    def _prune(self, now: float) -> None:
+        data = self._data
+        while data:
+            key = next(iter(data))
+            if data[key][0] > now:
+                break
+            del data[key]
+
+    def get(self, session_id: str, default: Optional[SessionState] = None) -> Optional[SessionState]:
+        entry = self._data.get(session_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> SessionState:
+        state = self.get(session_id)
+        if state is None:
+            raise KeyError(session_id)
+        return state
+
+    def __setitem__(self, session_id: str, state: SessionState) -> None:
+        now = time.monotonic()
+        self._prune(now)
+        self._data[session_id] = (now + self.ttl, state)
+        self._data.move_to_end(session_id)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, session_id: str, default: Optional[SessionState] = None) -> Optional[SessionState]:
+        entry = self._data.pop(session_id, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+SESSION_DB = SessionStore(ttl=SESSION_TTL_SECONDS, maxsize=SESSION_MAX_ENTRIES)
 
 
 def get_state(payload: IncomingMessage) -> SessionState:
@@ -231,29 +459,80 @@ def get_state(payload: IncomingMessage) -> SessionState:
         return payload.state
     if payload.prior_state is not None:
         return payload.prior_state
-    if payload.session_id in SESSION_DB:
-        return SESSION_DB[payload.session_id]
-    return SessionState()
+    stored = SESSION_DB.get(payload.session_id)
+    return stored if stored is not None else SessionState()
 
 
 def save_state(session_id: str, state: SessionState) -> None:
     SESSION_DB[session_id] = state
 
 
+# ---------------------------
+# Rate limiting (per client, in-memory)
+# ---------------------------
+
+# Requests per second allowed per client IP on /webchat/message; set
+# RATE_LIMIT_PER_SECOND=0 to disable. The key is the peer address as seen by
+# the server, so behind a reverse proxy run uvicorn with --proxy-headers and
+# --forwarded-allow-ips, or every patient shares the proxy's budget.
+RATE_LIMIT_PER_SECOND = int(os.environ.get("RATE_LIMIT_PER_SECOND", "10"))
+
+# Fixed one-second window; counts are dropped when the second rolls over,
+# so memory only holds clients seen in the current second.
+_rate_window: Dict[str, Any] = {"sec": -1, "counts": {}}
+
+
+async def rate_limit(request: Request) -> None:
+    # Runs as a dependency, i.e. before the request body is validated, so a
+    # rejected request costs one dict update instead of a full chat turn.
+    if RATE_LIMIT_PER_SECOND <= 0:
+        return
+    now = int(time.monotonic())
+    if now != _rate_window["sec"]:
+        _rate_window["sec"] = now
+        _rate_window["counts"] = {}
+
+    counts = _rate_window["counts"]
+    client = request.client.host if request.client else "unknown"
+    hits = counts.get(client, 0) + 1
+    counts[client] = hits
+    if hits > RATE_LIMIT_PER_SECOND:
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "1"})
+
+
 # ---------------------------
 # Policy layer (industry-safe)
 # ---------------------------
 
-def is_medical_or_medication_question(text: str) -> bool:
-    t = text.lower()
-    keywords = [
-        "antibiotic", "antibiotics", "amoxicillin", "penicillin", "clindamycin",
-        "medicine", "medication", "dose", "dosage", "should i",
-        "ibuprofen", "painkiller", "prescription",
-    ]
-    return any(k in t for k in keywords)
+MEDICAL_KEYWORDS = [
+    "antibiotic", "amoxicillin", "penicillin", "clindamycin",
+    "medicine", "medication", "dose", "overdose", "dosage", "should i",
+    "ibuprofen", "painkiller", "prescription",
+]
+
+_MEDICAL_KEYWORDS: Tuple[str, ...] = tuple(MEDICAL_KEYWORDS)
+
+# Whole words only (plural "s" allowed), so "should it" or "medicinecabinet"
+# do not trip the gate. Python's re backtracks at every position, so this is
+# only run to confirm a message that already contains a keyword substring.
+_MEDICAL_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in MEDICAL_KEYWORDS) + r")s?\b",
+    re.IGNORECASE,
+)
 
 
+def is_medical_or_medication_question(text: str, text_lc: Optional[str] = None) -> bool:
+    # text_lc: the already-lowered message, if the caller has one
+    t = text_lc if text_lc is not None else text.lower()
+    for k in _MEDICAL_KEYWORDS:
+        if k in t:
+            return _MEDICAL_RE.search(t) is not None
+    return False
+
+
+# practice_name is effectively constant per deployment, so the rendered reply
+# is cached; the bound keeps arbitrary client-supplied names from piling up.
+@lru_cache(maxsize=32)
 def limited_response_policy(practice_name: str) -> str:
     return (
         f"Thanks for your question. I can’t recommend specific medication (including antibiotics) "
@@ -269,6 +548,49 @@ def limited_response_policy(practice_name: str) -> str:
 # Lightweight extraction (demo-safe)
 # ---------------------------
 
+# Longer phrases first so "tomorrow morning" wins over "tomorrow".
+BEST_TIME_PHRASES = [
+    "tomorrow morning", "tomorrow afternoon", "tomorrow evening",
+    "today morning", "today afternoon", "today evening",
+    "tomorrow", "today", "anytime",
+]
+
+# Single extraction pass: every alternative carries exactly one named group,
+# so `m.lastgroup` tells us which field a match belongs to.
+# Only the label/phrase prefix is consumed; each value is captured inside a
+# lookahead, so the scan resumes right after the prefix and a value can still
+# contain matches for other fields ("My name is Alex and I am free tomorrow
+# morning" yields both a name and a best time).
+# Every lookahead capture is capped at the length that is kept (80 chars for
+# names, 120 for best time), so a message that repeats a label many times
+# costs linear time rather than rescanning to the end after each prefix.
+# Labels tolerate spaces around the separator ("Phone : ..."). Label captures
+# stop at the next field label or punctuation; names must start with a letter
+# and stop at digits so a trailing phone number is not swallowed.
+# The leading lookahead lists every character an alternative can start with,
+# so most positions are rejected before the alternation is tried at all.
+_EXTRACT_RE = re.compile(
+    r"""
+    (?=[ptmbnia+\d])
+    (?:
+      (?:phone|tel|mobile)\s*[:=\-]\s*(?=(?P<phone_label>[+\d][\d\ ()/.\-]{0,39}))
+    | best\s*time[\s:,=\-]*(?=(?P<best_label>(?:(?!\ phone|\ name)[^.;|]){0,120}))
+    | name\s*[:=\-]\s*(?=(?P<name_label>[^\W\d_](?:(?!\ phone|\ best\ time)[^,;.\d]){0,79}))
+    | \bmy\ name\ is\s+(?=(?P<name_mine>[^\W\d_](?:(?!\ phone|\ best\ time|\ and\ )[^,;.\d]){0,79}))
+    | \b(?:i\ am|i'm)\s+(?=(?P<name_phrase>[^\W\d_](?:(?!\ phone|\ best\ time|\ and\ )[^,;.\d]){0,79}))
+    | (?P<time_phrase>""" + "|".join(re.escape(p) for p in BEST_TIME_PHRASES) + r""")
+    | (?P<phone>\+?\d[\d\ ()/.\-]{7,}\d)
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+# Phone matches above can only contain digits, "+" and these separators, so
+# deleting the separators in one C-level translate() leaves just digits/+.
+_PHONE_SEPARATORS = str.maketrans("", "", " ()/.-")
+
+
 def update_collected_from_text(state: SessionState, user_text: str) -> SessionState:
     """
     Demo-safe extraction (no AI):
@@ -276,116 +598,44 @@ def update_collected_from_text(state: SessionState, user_text: str) -> SessionSt
     - Supports label style: "Name: Alex, Phone: +43..., Best time: tomorrow morning"
     - Phone: extracts digits/+ (simple)
     - Best time: extracts the part after "best time" or uses short phrase fallback
+
+    One scan of the message collects the first match per kind; label matches
+    take precedence over free-text fallbacks ("my name is" over "i am"/"i'm"),
+    and only missing fields are filled.
     """
     # Harden against None
     if state.collected is None:
         state.collected = Collected()
 
-    text = user_text.strip()
-    tl = text.lower()
-
-    # -----------------------
-    # PHONE (simple)
-    # -----------------------
-    if not state.collected.phone:
-        # Try label-based first: "phone: +43..."
-        for key in ["phone:", "phone=", "phone-", "tel:", "tel=", "tel-", "mobile:", "mobile=", "mobile-"]:
-            pos = tl.find(key)
-            if pos != -1:
-                candidate = text[pos + len(key):].strip()
-                # cut at next field label or punctuation
-                lowcand = candidate.lower()
-                for stop in [" best time", " name", ",", ";", "."]:
-                    idx2 = lowcand.find(stop)
-                    if idx2 != -1:
-                        candidate = candidate[:idx2].strip()
-                        lowcand = candidate.lower()
-                digits = "".join(ch for ch in candidate if ch.isdigit() or ch == "+")
-                if len(digits.replace("+", "")) >= 9:
-                    state.collected.phone = digits
-                break
-
-    # fallback: any phone-like digits in whole message
-    if not state.collected.phone:
-        digits = "".join(ch for ch in text if ch.isdigit() or ch == "+")
-        if len(digits.replace("+", "")) >= 9:
-            state.collected.phone = digits
-
-    # -----------------------
-    # BEST TIME (extract only relevant fragment)
-    # -----------------------
-    if not state.collected.best_time:
-        marker = "best time"
-        if marker in tl:
-            start = tl.find(marker)
-            best = text[start:].strip()
-
-            # remove the marker and separators
-            best_low = best.lower()
-            if best_low.startswith("best time"):
-                best = best[len("best time"):].lstrip(" :,-=").strip()
-
-            # cut at next field label or sentence stop
-            lowbest = best.lower()
-            for stop in [" phone", " name", ".", ";", "|"]:
-                idx2 = lowbest.find(stop)
-                if idx2 != -1:
-                    best = best[:idx2].strip()
-                    lowbest = best.lower()
-
-            if best:
-                state.collected.best_time = best
-        else:
-            # fallback: common short phrases
-            for phrase in [
-                "tomorrow morning", "tomorrow afternoon", "tomorrow evening",
-                "today morning", "today afternoon", "today evening",
-                "tomorrow", "today", "anytime"
-            ]:
-                if phrase in tl:
-                    state.collected.best_time = phrase
-                    break
-
-    # -----------------------
-    # NAME (robust)
-    # -----------------------
-    if not state.collected.name:
-        # 1) Label-based: "name: Alex"
-        # Also handles: "Name: Alex, Phone: ..."
-        for sep in [":", "=", "-"]:
-            key = "name" + sep
-            pos = tl.find(key)
-            if pos != -1:
-                candidate = text[pos + len(key):].strip()
-
-                lowcand = candidate.lower()
-                for stop in [" phone", " best time", ",", ";", "."]:
-                    idx2 = lowcand.find(stop)
-                    if idx2 != -1:
-                        candidate = candidate[:idx2].strip()
-                        lowcand = candidate.lower()
-
-                if len(candidate) >= 2:
-                    state.collected.name = candidate[:80]
-                break
-
-    if not state.collected.name:
-        # 2) Phrase-based: "my name is / i'm / i am"
-        for pat in ["my name is ", "i am ", "i'm "]:
-            idx = tl.find(pat)
-            if idx != -1:
-                name = text[idx + len(pat):].strip()
-
-                lowname = name.lower()
-                for stop in [" phone", " best time", ".", ",", ";", " and "]:
-                    idx2 = lowname.find(stop)
-                    if idx2 != -1:
-                        name = name[:idx2].strip()
-                        lowname = name.lower()
-
-                if len(name) >= 2:
-                    state.collected.name = name[:80]
-                break
+    found: Dict[str, str] = {}
+    for m in _EXTRACT_RE.finditer(user_text):
+        kind = m.lastgroup
+        if kind in found:
+            continue
+        value = m.group(kind).strip()
+
+        if kind in ("phone_label", "phone"):
+            value = value.translate(_PHONE_SEPARATORS)
+            if len(value.replace("+", "")) < 9:
+                continue
+        elif kind in ("name_label", "name_mine", "name_phrase"):
+            if len(value) < 2:
+                continue
+            value = value[:80]
+        elif kind == "time_phrase":
+            value = value.lower()
+        elif not value:
+            continue
+
+        found[kind] = value
+
+    collected = state.collected
+    if not collected.phone:
+        collected.phone = found.get("phone_label") or found.get("phone")
+    if not collected.best_time:
+        collected.best_time = found.get("best_label") or found.get("time_phrase")
+    if not collected.name:
+        collected.name = found.get("name_label") or found.get("name_mine") or found.get("name_phrase")
 
     return state
 
@@ -395,6 +645,62 @@ def update_collected_from_text(state: SessionState, user_text: str) -> SessionSt
 # State machine
 # ---------------------------
 
+MISSING_FIELD_LABELS = ("name", "phone number", "best time to call")
+
+_HANDOFF_TEMPLATE = (
+    "Thanks, {name}. I’ve captured your details.\n\n"
+    "Phone: {phone}\n"
+    "Best time: {best_time}\n\n"
+    "Someone from {practice_name} will contact you shortly."
+)
+
+
+# Missing-fields text for each 3-bit mask; bit i set = MISSING_FIELD_LABELS[i]
+# is still missing. Index 0 (nothing missing) is the empty string.
+_MISSING_TABLE: Tuple[str, ...] = tuple(
+    ", ".join(label for bit, label in enumerate(MISSING_FIELD_LABELS) if mask >> bit & 1)
+    for mask in range(8)
+)
+
+
+def _missing_mask(collected: Collected) -> int:
+    return (not collected.name) | (not collected.phone) << 1 | (not collected.best_time) << 2
+
+
+def _missing_str(collected: Collected) -> str:
+    return _MISSING_TABLE[_missing_mask(collected)]
+
+
+# Contact-collection flow as a lookup table, built once at import and indexed
+# by the missing-fields mask: (next step, reply). The reply is a finished
+# prompt, or None for the handoff, which is rendered by _handoff_reply.
+# The current step (LIMITED_RESPONSE or COLLECT_CONTACT) does not change the
+# outcome, so it is not part of the key.
+_CONTACT_TRANSITIONS: Tuple[Tuple[Step, Optional[str]], ...] = tuple(
+    (Step.COLLECT_CONTACT, (
+        f"To arrange a callback, I still need your {missing}. "
+        "You can reply in one message like: “Name: …, Phone: …, Best time: …”."
+    ))
+    if missing
+    else (Step.HANDOFF, None)
+    for missing in _MISSING_TABLE
+)
+
+
+def _handoff_reply(practice_name: str, collected: Collected) -> str:
+    return _HANDOFF_TEMPLATE.format(
+        name=collected.name,
+        phone=collected.phone,
+        best_time=collected.best_time,
+        practice_name=practice_name,
+    )
+
+
+@lru_cache(maxsize=32)
+def _handed_off_reply(practice_name: str) -> str:
+    return f"Thanks — your request is with the team at {practice_name}."
+
+
 def next_reply(practice_name: str, user_text: str, state: SessionState) -> tuple[str, SessionState]:
     """
     Policy-first routing:
@@ -404,15 +710,18 @@ def next_reply(practice_name: str, user_text: str, state: SessionState) -> tuple
     3) If in contact flow, extract name/phone/best time and transition to HANDOFF when complete
     """
 
+    # Lowered once here and shared by the keyword scans below.
+    user_text_lc = user_text.lower()
+
     # 1) Policy gate at any time (no medical or medication advice)
-    if is_medical_or_medication_question(user_text):
+    if is_medical_or_medication_question(user_text, user_text_lc):
         state.step = Step.LIMITED_RESPONSE
         return limited_response_policy(practice_name), state
 
     # 2) Front-desk FAQ router (safe topics only)
-    faq = match_faq_intent(user_text)
+    faq = match_faq_intent(user_text, user_text_lc)
     if faq:
-        answer = faq["answer"]()
+        answer = faq["answer"]
         forces_contact = bool(faq.get("forces_contact_flow"))
 
         # If FAQ is booking/cancel/emergency: enter contact-collection flow
@@ -422,91 +731,58 @@ def next_reply(practice_name: str, user_text: str, state: SessionState) -> tuple
             # Try to extract contact info from the same message (e.g., "Name:..., Phone:...")
             state = update_collected_from_text(state, user_text)
 
-            missing = []
-            if not state.collected.name:
-                missing.append("name")
-            if not state.collected.phone:
-                missing.append("phone number")
-            if not state.collected.best_time:
-                missing.append("best time to call")
-
+            missing = _missing_str(state.collected)
             if missing:
-                answer += "\n\nTo proceed, I still need your " + ", ".join(missing) + "."
+                answer += f"\n\nTo proceed, I still need your {missing}."
                 return answer, state
 
             # If we already have everything, hand off immediately
             state.step = Step.HANDOFF
-            return (
-                f"{answer}\n\n"
-                f"Thanks, {state.collected.name}. I’ve captured your details.\n\n"
-                f"Phone: {state.collected.phone}\n"
-                f"Best time: {state.collected.best_time}\n\n"
-                f"Someone from {practice_name} will contact you shortly.",
-                state,
-            )
+            return f"{answer}\n\n{_handoff_reply(practice_name, state.collected)}", state
 
         # If it's a simple FAQ and we are not collecting contact, just answer
         if state.step != Step.COLLECT_CONTACT:
             return answer, state
 
         # If we are already collecting contact, answer FAQ AND remind missing fields
-        missing = []
-        if not state.collected.name:
-            missing.append("name")
-        if not state.collected.phone:
-            missing.append("phone number")
-        if not state.collected.best_time:
-            missing.append("best time to call")
+        missing = _missing_str(state.collected)
         if missing:
-            answer += "\n\nTo proceed, I still need your " + ", ".join(missing) + "."
+            answer += f"\n\nTo proceed, I still need your {missing}."
         return answer, state
 
     # 3) Contact collection flow (if already active)
     if state.step in (Step.LIMITED_RESPONSE, Step.COLLECT_CONTACT):
         state = update_collected_from_text(state, user_text)
 
-        missing = []
-        if not state.collected.name:
-            missing.append("name")
-        if not state.collected.phone:
-            missing.append("phone number")
-        if not state.collected.best_time:
-            missing.append("best time to call")
-
-        if missing:
-            state.step = Step.COLLECT_CONTACT
-            return (
-                "To arrange a callback, I still need your " + ", ".join(missing)
-                + ". You can reply in one message like: “Name: …, Phone: …, Best time: …”.",
-                state,
-            )
-
-        state.step = Step.HANDOFF
-        return (
-            f"Thanks, {state.collected.name}. I’ve captured your details.\n\n"
-            f"Phone: {state.collected.phone}\n"
-            f"Best time: {state.collected.best_time}\n\n"
-            f"Someone from {practice_name} will contact you shortly.",
-            state,
-        )
+        state.step, reply = _CONTACT_TRANSITIONS[_missing_mask(state.collected)]
+        if reply is None:
+            reply = _handoff_reply(practice_name, state.collected)
+        return reply, state
 
     # 4) Already handed off
-    return (
-        f"Thanks — your request is with the team at {practice_name}.",
-        state,
-    )
+    return _handed_off_reply(practice_name), state
 
 # ---------------------------
 # Routes
 # ---------------------------
+# Handlers only touch in-memory state (no blocking I/O), so they are async
+# and run directly on the event loop instead of hopping to the threadpool.
 
 @app.get("/health")
-def health() -> Dict[str, str]:
+async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
-@app.post("/webchat/message", response_model=OutgoingMessage)
-def webchat_message(payload: IncomingMessage) -> OutgoingMessage:
+# No response_model: the reply is built from already-validated data, so it is
+# serialized straight from a dict instead of going through a model and
+# FastAPI's response validation. OutgoingMessage documents the shape and is
+# still listed under `responses` for the OpenAPI docs.
+@app.post(
+    "/webchat/message",
+    responses={200: {"model": OutgoingMessage}},
+    dependencies=[Depends(rate_limit)],
+)
+async def webchat_message(payload: IncomingMessage) -> ORJSONResponse:
     old_state = get_state(payload)
     old_step = old_state.step  # ✅ snapshot BEFORE mutation
 
@@ -526,106 +802,139 @@ def webchat_message(payload: IncomingMessage) -> OutgoingMessage:
         }
         reply = reply + f"\n\n✅ Callback ticket created: {ticket.ticket_id}"
 
-    return OutgoingMessage(
-        session_id=payload.session_id,
-        channel=payload.channel,
-        practice_name=payload.practice_name,
-        user_message=payload.user_message,
-        reply=reply,
-        state=new_state,
-        ticket=ticket_info,
-    )
+    return ORJSONResponse({
+        "session_id": payload.session_id,
+        "channel": payload.channel,
+        "practice_name": payload.practice_name,
+        "user_message": payload.user_message,
+        "reply": reply,
+        "state": asdict(new_state),
+        "ticket": ticket_info,
+    })
 
 
 
 @app.post("/admin/reset_session/{session_id}")
-def reset_session(session_id: str) -> Dict[str, Any]:
+async def reset_session(session_id: str) -> Dict[str, Any]:
     SESSION_DB.pop(session_id, None)
 
     # remove tickets linked to this session (demo convenience)
     global TICKET_DB
-    TICKET_DB = [t for t in TICKET_DB if t.session_id != session_id]
+    TICKET_DB = deque((t for t in TICKET_DB if t.session_id != session_id), maxlen=TICKET_DB.maxlen)
 
     return {"ok": True, "session_id": session_id}
 
 
-@app.get("/staff", response_class=HTMLResponse)
-def staff_dashboard():
-    rows = []
-    for t in TICKET_DB[:50]:
-        rows.append(f"""
+# Static dashboard page, built once; only the table rows change per request.
+_STAFF_PAGE_TEMPLATE = """<html>
+<head>
+  <meta charset="utf-8" />
+  <meta name="viewport" content="width=device-width,initial-scale=1" />
+  <title>Staff Dashboard</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f5f5f5; margin:0; padding:24px; }
+    .card { background:#fff; border-radius:14px; padding:16px; box-shadow: 0 2px 10px rgba(0,0,0,.08); }
+    table { width:100%; border-collapse: collapse; }
+    th, td { border-bottom: 1px solid #eee; text-align:left; padding:10px; font-size:14px; vertical-align: top; }
+    th { background:#fafafa; }
+    .top { display:flex; justify-content:space-between; align-items:center; margin-bottom:12px; gap:12px; flex-wrap: wrap; }
+    a.button { padding:8px 12px; border:1px solid #ddd; border-radius:10px; text-decoration:none; color:#333; background:#fff; }
+    .hint { color:#666; font-size:12px; }
+  </style>
+</head>
+<body>
+  <div class="card">
+    <div class="top">
+      <div>
+        <h3 style="margin:0;">Dental Clinic — Callback Tasks</h3>
+        <div class="hint">This is a demo inbox (in-memory). Refresh to see new tickets.</div>
+      </div>
+      <div>
+        <a class="button" href="/">Open Chat</a>
+        <a class="button" href="/staff">Refresh</a>
+      </div>
+    </div>
+    <table>
+      <thead>
         <tr>
-          <td>{t.ticket_id}</td>
-          <td>{t.created_at}</td>
-          <td>{t.name}</td>
-          <td>{t.phone}</td>
-          <td>{t.best_time}</td>
-          <td>{t.summary}</td>
-          <td>{t.status}</td>
+          <th>Ticket</th>
+          <th>Created (UTC)</th>
+          <th>Name</th>
+          <th>Phone</th>
+          <th>Best time</th>
+          <th>Summary</th>
+          <th>Status</th>
         </tr>
-        """)
-
-    html = f"""
-    <html>
-    <head>
-      <meta charset="utf-8" />
-      <meta name="viewport" content="width=device-width,initial-scale=1" />
-      <title>Staff Dashboard</title>
-      <style>
-        body {{ font-family: Arial, sans-serif; background:#f5f5f5; margin:0; padding:24px; }}
-        .card {{ background:#fff; border-radius:14px; padding:16px; box-shadow: 0 2px 10px rgba(0,0,0,.08); }}
-        table {{ width:100%; border-collapse: collapse; }}
-        th, td {{ border-bottom: 1px solid #eee; text-align:left; padding:10px; font-size:14px; vertical-align: top; }}
-        th {{ background:#fafafa; }}
-        .top {{ display:flex; justify-content:space-between; align-items:center; margin-bottom:12px; gap:12px; flex-wrap: wrap; }}
-        a.button {{ padding:8px 12px; border:1px solid #ddd; border-radius:10px; text-decoration:none; color:#333; background:#fff; }}
-        .hint {{ color:#666; font-size:12px; }}
-      </style>
-    </head>
-    <body>
-      <div class="card">
-        <div class="top">
-          <div>
-            <h3 style="margin:0;">Dental Clinic — Callback Tasks</h3>
-            <div class="hint">This is a demo inbox (in-memory). Refresh to see new tickets.</div>
-          </div>
-          <div>
-            <a class="button" href="/">Open Chat</a>
-            <a class="button" href="/staff">Refresh</a>
-          </div>
-        </div>
-        <table>
-          <thead>
-            <tr>
-              <th>Ticket</th>
-              <th>Created (UTC)</th>
-              <th>Name</th>
-              <th>Phone</th>
-              <th>Best time</th>
-              <th>Summary</th>
-              <th>Status</th>
-            </tr>
-          </thead>
-          <tbody>
-            {''.join(rows) if rows else '<tr><td colspan="7">No tickets yet.</td></tr>'}
-          </tbody>
-        </table>
-      </div>
-    </body>
-    </html>
-    """
-    return html
+      </thead>
+      <tbody>
+        {rows_html}
+      </tbody>
+    </table>
+  </div>
+</body>
+</html>
+"""
 
+# Split once so each render is two concatenations instead of a search for the
+# placeholder in the full page.
+_STAFF_HEAD, _, _STAFF_FOOT = _STAFF_PAGE_TEMPLATE.partition("{rows_html}")
 
-@app.get("/", response_class=HTMLResponse)
-def home():
-    # Serves your customer-friendly chat UI
+_STAFF_EMPTY_ROW = '<tr><td colspan="7">No tickets yet.</td></tr>'
+
+# Ticket ids restart at T-0001 with the process, so the dashboard ETag also
+# carries a per-process token to keep pre-restart browser copies from matching.
+_BOOT_ID = format(time.time_ns(), "x")
+
+
+def _staff_etag() -> str:
+    # Tickets are append-only and never edited, so the count plus the newest id
+    # changes whenever the visible rows can change (new ticket or reset).
+    newest = TICKET_DB[0].ticket_id if TICKET_DB else "0"
+    return f'W/"{_BOOT_ID}-{len(TICKET_DB)}-{newest}"'
+
+
+@app.get("/staff", response_class=HTMLResponse)
+async def staff_dashboard(request: Request):
+    # no-cache (not no-store): browsers keep the page but revalidate every
+    # time, so a refresh with no new tickets is answered with an empty 304.
+    headers = {"ETag": _staff_etag(), "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    # Rows are escaped and rendered once per ticket (see create_ticket).
+    rows_html = "".join(t._row_html for t in islice(TICKET_DB, 50))
+    html = _STAFF_HEAD + (rows_html or _STAFF_EMPTY_ROW) + _STAFF_FOOT
+    return HTMLResponse(html, headers=headers)
+
+
+def _load_chat_html() -> Optional[bytes]:
+    # Read once at import; the chat UI only changes on deploy.
     try:
-        with open("chat.html", "r", encoding="utf-8") as f:
-            return f.read()
+        return Path("chat.html").read_bytes()
     except FileNotFoundError:
-        return (
-            "<h3>chat.html not found</h3>"
-            "<p>Create <b>chat.html</b> next to <b>main.py</b> to use the chat UI.</p>"
-            "<p>You can still test the API via <a href='/docs'>/docs</a>.</p>"
-        )
+        return None
+
+
+_CHAT_HTML = _load_chat_html()
+# The cached bytes never change within a process, so the ETag is computed once.
+_CHAT_HTML_HEADERS = (
+    {"ETag": f'"{hashlib.sha1(_CHAT_HTML).hexdigest()}"', "Cache-Control": "public, max-age=60"}
+    if _CHAT_HTML is not None
+    else {}
+)
+
+_CHAT_HTML_MISSING = (
+    "<h3>chat.html not found</h3>"
+    "<p>Create <b>chat.html</b> next to <b>main.py</b> to use the chat UI.</p>"
+    "<p>You can still test the API via <a href='/docs'>/docs</a>.</p>"
+)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    # Serves your customer-friendly chat UI
+    if _CHAT_HTML is None:
+        return HTMLResponse(_CHAT_HTML_MISSING)
+    if request.headers.get("if-none-match") == _CHAT_HTML_HEADERS["ETag"]:
+        return Response(status_code=304, headers=_CHAT_HTML_HEADERS)
+    return HTMLResponse(_CHAT_HTML, headers=_CHAT_HTML_HEADERS)
@@ -0,0 +1,41 @@
+import time
+import unittest
+
+from main import SessionState, update_collected_from_text
+
+
+def extract(text: str):
+    return update_collected_from_text(SessionState(), text).collected
+
+
+class ExtractionTest(unittest.TestCase):
+    def test_label_style(self):
+        c = extract("Name: Alex, Phone: +43 660 1234567, Best time: tomorrow morning")
+        self.assertEqual((c.name, c.phone, c.best_time), ("Alex", "+436601234567", "tomorrow morning"))
+
+    def test_name_phrase_does_not_swallow_best_time(self):
+        c = extract("My name is Alex and I am free tomorrow morning")
+        self.assertEqual((c.name, c.best_time), ("Alex", "tomorrow morning"))
+
+    def test_my_name_is_wins_over_i_am(self):
+        c = extract("I am available tomorrow morning, my name is Alex")
+        self.assertEqual((c.name, c.best_time), ("Alex", "tomorrow morning"))
+
+    def test_dotted_phone_numbers(self):
+        self.assertEqual(extract("Phone: +43.660.1234567").phone, "+436601234567")
+        self.assertEqual(extract("0664.123.4567").phone, "06641234567")
+
+    def test_captures_are_truncated(self):
+        self.assertEqual(len(extract("Name: " + "a" * 500).name), 80)
+        self.assertEqual(len(extract("best time: " + "a" * 500).best_time), 120)
+
+    def test_repeated_labels_take_linear_time(self):
+        # Unbounded lookahead captures made these quadratic (~1 s for 20 KB).
+        for text in ("best time " * 5000, "i am ab " * 5000, "name: ab " * 5000, "my name is ab " * 5000):
+            start = time.perf_counter()
+            extract(text)
+            self.assertLess(time.perf_counter() - start, 0.5, text[:20])
+
+
+if __name__ == "__main__":
+    unittest.main()